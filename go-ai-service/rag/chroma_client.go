@@ -24,6 +24,7 @@ type ChromaClient struct {
 	tenant       string
 	database     string
 	collectionID string
+	cache        *SemanticCache
 }
 
 // NewChromaClient 创建新的 Chroma 客户端
@@ -34,6 +35,7 @@ func NewChromaClient(host, port, apiKey string) *ChromaClient {
 		httpClient: &http.Client{},
 		tenant:     "default_tenant",
 		database:   "default_database",
+		cache:      NewSemanticCache(semanticCacheSize, semanticCacheThreshold, semanticCacheTTL),
 	}
 }
 
@@ -60,18 +62,32 @@ func (c *ChromaClient) SearchKnowledge(query string, topK int) ([]Document, erro
 		}
 	}
 
+	// 相同查询直接命中缓存，无需生成嵌入向量
+	if documents, ok := c.cache.GetByQuery(c.collectionID, query, topK); ok {
+		log.Printf("⚡ 命中查询缓存，返回 %d 个相关文档", len(documents))
+		return documents, nil
+	}
+
 	// 1. 生成查询向量
 	embedding, err := c.generateEmbedding(query)
 	if err != nil {
 		return nil, fmt.Errorf("生成嵌入向量失败: %w", err)
 	}
 
+	// 相似查询复用已有的检索结果，无需查询 Chroma
+	if documents, ok := c.cache.GetByEmbedding(c.collectionID, embedding, topK); ok {
+		log.Printf("⚡ 命中语义缓存，返回 %d 个相关文档", len(documents))
+		return documents, nil
+	}
+
 	// 2. 在 Chroma 中查询
 	documents, err := c.queryChroma(embedding, topK)
 	if err != nil {
 		return nil, fmt.Errorf("查询 Chroma 失败: %w", err)
 	}
 
+	c.cache.Put(c.collectionID, query, embedding, topK, documents)
+
 	log.Printf("✅ 找到 %d 个相关文档", len(documents))
 
 	return documents, nil
@@ -425,6 +441,9 @@ func (c *ChromaClient) AddDocuments(docs []Document) error {
 		return fmt.Errorf("Chroma 添加文档错误 (状态码 %d): %s", resp.StatusCode, string(body))
 	}
 
+	// 知识库已变化，缓存的检索结果失效
+	c.cache.Reset()
+
 	log.Printf("✅ 成功添加 %d 条文档到 Chroma", len(docs))
 	return nil
 }
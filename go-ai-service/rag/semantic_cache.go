@@ -0,0 +1,148 @@
+package rag
+
+import (
+	"math"
+	"sync"
+	"time"
+)
+
+const (
+	semanticCacheSize      = 512
+	semanticCacheThreshold = 0.97
+	semanticCacheTTL       = 10 * time.Minute
+)
+
+// semanticCacheEntry 缓存的一次检索结果
+type semanticCacheEntry struct {
+	namespace string
+	query     string
+	topK      int
+	embedding []float32 // 已 L2 归一化
+	documents []Document
+	createdAt time.Time
+}
+
+// SemanticCache 语义缓存：相似度足够高的查询直接复用上一次的检索结果
+type SemanticCache struct {
+	mu        sync.RWMutex
+	entries   []semanticCacheEntry // 环形缓冲区
+	next      int
+	size      int
+	threshold float64
+	ttl       time.Duration
+}
+
+// NewSemanticCache 创建新的语义缓存
+func NewSemanticCache(size int, threshold float64, ttl time.Duration) *SemanticCache {
+	return &SemanticCache{
+		entries:   make([]semanticCacheEntry, 0, size),
+		size:      size,
+		threshold: threshold,
+		ttl:       ttl,
+	}
+}
+
+// GetByQuery 按查询文本精确匹配，命中时可跳过生成嵌入向量
+func (c *SemanticCache) GetByQuery(namespace, query string, topK int) ([]Document, bool) {
+	c.mu.RLock()
+	defer c.mu.RUnlock()
+
+	now := time.Now()
+	for i := range c.entries {
+		entry := &c.entries[i]
+		if entry.namespace == namespace && entry.topK == topK && entry.query == query &&
+			now.Sub(entry.createdAt) <= c.ttl {
+			return entry.documents, true
+		}
+	}
+	return nil, false
+}
+
+// GetByEmbedding 查找余弦相似度超过阈值的缓存结果
+func (c *SemanticCache) GetByEmbedding(namespace string, embedding []float64, topK int) ([]Document, bool) {
+	query := normalizeEmbedding(embedding)
+	if query == nil {
+		return nil, false
+	}
+
+	c.mu.RLock()
+	defer c.mu.RUnlock()
+
+	now := time.Now()
+	best := -1
+	bestSim := c.threshold
+	for i := range c.entries {
+		entry := &c.entries[i]
+		if entry.namespace != namespace || entry.topK != topK || len(entry.embedding) != len(query) ||
+			now.Sub(entry.createdAt) > c.ttl {
+			continue
+		}
+
+		var sim float64
+		for j, v := range entry.embedding {
+			sim += float64(v * query[j])
+		}
+		if sim > bestSim {
+			best, bestSim = i, sim
+		}
+	}
+
+	if best < 0 {
+		return nil, false
+	}
+	return c.entries[best].documents, true
+}
+
+// Put 写入检索结果，缓冲区满时覆盖最旧的条目
+func (c *SemanticCache) Put(namespace, query string, embedding []float64, topK int, documents []Document) {
+	normalized := normalizeEmbedding(embedding)
+	if normalized == nil {
+		return
+	}
+
+	entry := semanticCacheEntry{
+		namespace: namespace,
+		query:     query,
+		topK:      topK,
+		embedding: normalized,
+		documents: documents,
+		createdAt: time.Now(),
+	}
+
+	c.mu.Lock()
+	defer c.mu.Unlock()
+
+	if len(c.entries) < c.size {
+		c.entries = append(c.entries, entry)
+	} else {
+		c.entries[c.next] = entry
+	}
+	c.next = (c.next + 1) % c.size
+}
+
+// Reset 清空缓存（知识库内容变化后调用）
+func (c *SemanticCache) Reset() {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+
+	c.entries = c.entries[:0]
+	c.next = 0
+}
+
+// normalizeEmbedding 返回 L2 归一化后的 float32 向量（零向量返回 nil）
+func normalizeEmbedding(embedding []float64) []float32 {
+	var norm float64
+	for _, v := range embedding {
+		norm += v * v
+	}
+	norm = math.Sqrt(norm)
+	if norm == 0 {
+		return nil
+	}
+
+	normalized := make([]float32, len(embedding))
+	for i, v := range embedding {
+		normalized[i] = float32(v / norm)
+	}
+	return normalized
+}
@@ -40,6 +40,24 @@ public class OrderController {
         }
     }
 
+    @PostMapping("/by-name")
+    public ResponseEntity<?> createOrderByProductName(@RequestBody CreateOrderByNameRequest request) {
+        try {
+            Order order = orderService.createOrderByProductName(
+                request.getProductName(),
+                request.getQuantity(),
+                request.getCustomerName(),
+                request.getCustomerPhone(),
+                request.getShippingAddress()
+            );
+            return ResponseEntity.ok(order);
+        } catch (Exception e) {
+            Map<String, String> error = new HashMap<>();
+            error.put("error", e.getMessage());
+            return ResponseEntity.badRequest().body(error);
+        }
+    }
+
     @GetMapping
     public ResponseEntity<List<Order>> getAllOrders() {
         return ResponseEntity.ok(orderService.getAllOrders());
@@ -91,6 +109,15 @@ public class OrderController {
         private String shippingAddress;
     }
 
+    @Data
+    public static class CreateOrderByNameRequest {
+        private String productName;
+        private Integer quantity;
+        private String customerName;
+        private String customerPhone;
+        private String shippingAddress;
+    }
+
     @Data
     public static class UpdateStatusRequest {
         private Order.OrderStatus status;
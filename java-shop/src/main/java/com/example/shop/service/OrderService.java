@@ -62,6 +62,19 @@ public class OrderService {
         return savedOrder;
     }
 
+    /**
+     * 按商品名称创建订单（使用第一个匹配的商品）
+     */
+    @Transactional
+    public Order createOrderByProductName(String productName, Integer quantity, String customerName,
+                                          String customerPhone, String shippingAddress) {
+        Product product = productService.searchProducts(productName).stream()
+            .findFirst()
+            .orElseThrow(() -> new RuntimeException("未找到商品 '" + productName + "'，请检查商品名称是否正确"));
+
+        return createOrder(product.getId(), quantity, customerName, customerPhone, shippingAddress);
+    }
+
     /**
      * 获取所有订单
      */
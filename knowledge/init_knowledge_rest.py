@@ -8,10 +8,20 @@
 import os
 import sys
 import time
+import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import hashlib
-import random
+import sqlite3
+from contextlib import closing
+from itertools import islice
+
+import numpy as np
+import orjson
 
 # 配置
 DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY")
@@ -22,48 +32,162 @@ COLLECTION_NAME = "shop_knowledge"
 # DashScope Embedding API
 EMBEDDING_API_URL = "https://dashscope.aliyuncs.com/api/v1/services/embeddings/text-embedding/text-embedding"
 EMBEDDING_MODEL = "text-embedding-v2"
+EMBEDDING_BATCH_SIZE = 25  # DashScope 单次请求最多支持 25 条文本
+EMBEDDING_CONCURRENCY = 8  # 同时进行的 Embedding 请求数
+EMBEDDING_RATE_LIMIT = 10  # 每秒最多发起的 Embedding 请求数(令牌桶),避免超出 QPS 限制
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite")
 
+# Chroma 单次 /add 请求的文档数,过大的请求会导致索引超时
+CHROMA_BATCH_SIZE = 200
+EMBEDDING_WIRE_DECIMALS = 5  # 上传时保留的小数位数(不低于 float16 对归一化向量的精度)
 
-def generate_embedding(text: str) -> list:
-    """生成文本的嵌入向量"""
-    try:
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {DASHSCOPE_API_KEY}"
-        }
-        
-        data = {
-            "model": EMBEDDING_MODEL,
-            "input": {
-                "texts": [text]
-            }
+# 复用连接的 HTTP 会话(keep-alive + 连接池 + 失败重试)
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504])
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
+
+def chunks(seq: list, n: int):
+    """将序列按每 n 个元素切分"""
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """对 (N, D) 矩阵的每一行做 L2 归一化(原地修改)"""
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def fallback_embeddings(texts: list[str]) -> list[np.ndarray]:
+    """本地回退:根据文本 MD5 生成确定性向量"""
+    matrix = np.empty((len(texts), 1536), dtype=np.float32)
+    for row, text in zip(matrix, texts):
+        hash_int = int(hashlib.md5(text.encode('utf-8')).hexdigest(), 16)
+        row[:] = np.random.default_rng(hash_int).uniform(-1, 1, 1536)
+    return list(normalize_rows(matrix))
+
+
+async def request_embeddings(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                             limiter: AsyncLimiter, texts: list[str]) -> list[np.ndarray]:
+    """调用 DashScope 一次性生成一批文本的嵌入向量"""
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {DASHSCOPE_API_KEY}"
+    }
+    
+    data = {
+        "model": EMBEDDING_MODEL,
+        "input": {
+            "texts": texts
         }
+    }
+    
+    async with semaphore, limiter:
+        async with session.post(EMBEDDING_API_URL, json=data, headers=headers) as response:
+            if response.status != 200:
+                print(f"❌ Embedding API 错误 (状态码 {response.status})")
+                raise Exception(await response.text())
+            
+            result = await response.json()
+    
+    if "output" in result and "embeddings" in result["output"]:
+        embeddings = sorted(result["output"]["embeddings"], key=lambda e: e["text_index"])
+        if len(embeddings) == len(texts):
+            return [np.asarray(e["embedding"], dtype=np.float32) for e in embeddings]
+    
+    raise Exception(f"无效的响应结构")
+
+
+async def embed_batch(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                      limiter: AsyncLimiter, texts: list[str]) -> list[np.ndarray | None]:
+    """生成一批文本的嵌入向量,API 失败时返回 None 占位"""
+    try:
+        return await request_embeddings(session, semaphore, limiter, texts)
+    except Exception as e:
+        print(f"⚠️  Embedding API 失败: {str(e)[:100]}")
+        return [None] * len(texts)
+
+
+async def generate_embeddings_async(texts: list[str]) -> list[np.ndarray | None]:
+    """按 EMBEDDING_BATCH_SIZE 分批,并发请求所有批次"""
+    iterator = iter(texts)
+    batches = list(iter(lambda: list(islice(iterator, EMBEDDING_BATCH_SIZE)), []))
+    
+    semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+    limiter = AsyncLimiter(EMBEDDING_RATE_LIMIT, 1.0)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        results = await asyncio.gather(*(embed_batch(session, semaphore, limiter, batch) for batch in batches))
+    
+    return [embedding for batch in results for embedding in batch]
+
+
+def embedding_cache_key(text: str) -> str:
+    """缓存键:模型名与文本内容的 SHA-256"""
+    return hashlib.sha256((EMBEDDING_MODEL + "\x00" + text).encode('utf-8')).hexdigest()
+
+
+def open_embedding_cache() -> sqlite3.Connection:
+    """打开本地嵌入向量缓存"""
+    conn = sqlite3.connect(EMBEDDING_CACHE_PATH)
+    conn.execute("CREATE TABLE IF NOT EXISTS emb (hash TEXT PRIMARY KEY, vec BLOB, model TEXT)")
+    return conn
+
+
+def generate_embeddings(texts: list[str]) -> list[np.ndarray]:
+    """批量生成文本的嵌入向量,已缓存的文本不再请求 API"""
+    keys = [embedding_cache_key(text) for text in texts]
+    
+    with closing(open_embedding_cache()) as conn:
+        embeddings = []
+        for key in keys:
+            row = conn.execute("SELECT vec FROM emb WHERE hash = ?", (key,)).fetchone()
+            embeddings.append(np.frombuffer(row[0], dtype=np.float32) if row else None)
         
-        response = requests.post(EMBEDDING_API_URL, json=data, headers=headers, timeout=10)
-        
-        if response.status_code != 200:
-            print(f"❌ Embedding API 错误 (状态码 {response.status_code})")
-            raise Exception(response.text)
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if len(misses) < len(texts):
+            print(f"   缓存命中: {len(texts) - len(misses)}/{len(texts)}")
+        if not misses:
+            return embeddings
         
-        result = response.json()
+        fresh = asyncio.run(generate_embeddings_async([texts[i] for i in misses]))
         
-        if "output" in result and "embeddings" in result["output"]:
-            embeddings = result["output"]["embeddings"]
-            if len(embeddings) > 0:
-                return embeddings[0]["embedding"]
+        # 仅缓存 API 返回的向量,本地回退向量不写入缓存
+        rows = []
+        failed = []
+        for i, embedding in zip(misses, fresh):
+            if embedding is None:
+                failed.append(i)
+            else:
+                embeddings[i] = embedding
+                rows.append((keys[i], embedding.tobytes(), EMBEDDING_MODEL))
         
-        raise Exception(f"无效的响应结构")
+        for i, embedding in zip(failed, fallback_embeddings([texts[i] for i in failed])):
+            embeddings[i] = embedding
         
-    except Exception as e:
-        print(f"⚠️  Embedding API 失败: {str(e)[:100]}")
-        # 本地回退:生成确定性向量
-        hash_obj = hashlib.md5(text.encode('utf-8'))
-        hash_int = int(hash_obj.hexdigest(), 16)
-        random.seed(hash_int)
-        embedding = [random.uniform(-1, 1) for _ in range(1536)]
-        norm = sum(x**2 for x in embedding) ** 0.5
-        embedding = [x / norm for x in embedding]
-        return embedding
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO emb (hash, vec, model) VALUES (?, ?, ?)", rows)
+    
+    return embeddings
+
+
+def quantize_embeddings(embeddings: np.ndarray) -> np.ndarray:
+    """将向量量化到 float16 精度,缩短请求体中每个数字的长度"""
+    matrix = embeddings.astype(np.float16).astype(np.float32)
+    # float16 值的 float32 最短表示并不会变短,按 float16 的有效精度截断小数位
+    return np.round(matrix, EMBEDDING_WIRE_DECIMALS)
+
+
+def post_json(url: str, payload: dict, timeout: float) -> requests.Response:
+    """使用 orjson 序列化请求体(支持 NumPy 数组)并发送 POST 请求"""
+    body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return SESSION.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=timeout)
 
 
 def init_knowledge_base():
@@ -80,11 +204,13 @@ def init_knowledge_base():
     tenant = "default_tenant"
     database = "default_database"
     
-    # 等待 Chroma 启动
-    max_retries = 30
+    # 等待 Chroma 启动(指数退避:从 0.1s 开始,最长间隔 2s,共约 11s)
+    max_retries = 10
     for i in range(max_retries):
         try:
-            response = requests.get(f"{chroma_url}/api/v2/auth/identity", timeout=2)
+            # 探测请求不走 SESSION 的自动重试,重试节奏由本循环控制
+            response = requests.get(f"{chroma_url}/api/v2/auth/identity", timeout=1.0)
+            response.raise_for_status()
             identity = response.json()
             tenant = identity.get("tenant", "default_tenant")
             databases = identity.get("databases", ["default_database"])
@@ -99,15 +225,16 @@ def init_knowledge_base():
             sys.exit(1)
         
         print(f"⏳ 等待 Chroma ({i+1}/{max_retries})")
-        time.sleep(1)
+        time.sleep(min(2.0, 0.1 * 2 ** i))
     
     # 创建集合
     print(f"\n📝 创建集合...")
     collection_id = None
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{chroma_url}/api/v2/tenants/{tenant}/databases/{database}/collections",
-            json={"name": COLLECTION_NAME},
+            # 向量在写入前已归一化,内积等价于余弦相似度,查询时省去归一化计算
+            json={"name": COLLECTION_NAME, "metadata": {"hnsw:space": "ip"}},
             timeout=5
         )
         if response.status_code in [200, 201]:
@@ -123,7 +250,7 @@ def init_knowledge_base():
     if not collection_id:
         print(f"📝 查询现有集合...")
         try:
-            response = requests.get(
+            response = SESSION.get(
                 f"{chroma_url}/api/v2/tenants/{tenant}/databases/{database}/collections",
                 timeout=5
             )
@@ -164,30 +291,18 @@ def init_knowledge_base():
     
     # 生成嵌入向量
     ids = []
-    embeddings = []
     documents = []
     metadatas = []
     
     for i, item in enumerate(knowledge_data):
         print(f"   [{i+1}/{len(knowledge_data)}] {item['id']}")
         
-        embedding = generate_embedding(item["text"])
         ids.append(item["id"])
-        embeddings.append(embedding)
         documents.append(item["text"])
         metadatas.append({"category": item["category"]})
-        
-        time.sleep(0.3)  # 避免请求过快
     
-    # 向 Chroma 添加文档
-    print(f"\n📤 添加到 Chroma...")
-    
-    payload = {
-        "ids": ids,
-        "documents": documents,
-        "embeddings": embeddings,
-        "metadatas": metadatas
-    }
+    # 所有向量放在一个连续的 (N, 1536) float32 矩阵中,分批上传时只取视图,不复制
+    embeddings = normalize_rows(np.stack(generate_embeddings(documents)))
     
     # 向 Chroma 添加文档
     print(f"\n📤 添加到 Chroma...")
@@ -195,21 +310,22 @@ def init_knowledge_base():
     payload = {
         "ids": ids,
         "documents": documents,
-        "embeddings": embeddings,
+        "embeddings": quantize_embeddings(embeddings),
         "metadatas": metadatas
     }
     
     try:
-        response = requests.post(
-            f"{chroma_url}/api/v2/tenants/{tenant}/databases/{database}/collections/{collection_id}/add",
-            json=payload,
-            timeout=30
-        )
+        add_url = f"{chroma_url}/api/v2/tenants/{tenant}/databases/{database}/collections/{collection_id}/add"
+        batches = zip(*(chunks(payload[key], CHROMA_BATCH_SIZE) for key in payload))
         
-        if response.status_code not in [200, 201]:
-            print(f"❌ 添加失败 (状态码 {response.status_code})")
-            print(f"   响应: {response.text[:200]}")
-            return False
+        for batch in batches:
+            # 每批单独序列化为 bytes,请求体峰值内存只与批大小相关
+            response = post_json(add_url, dict(zip(payload, batch)), timeout=30)
+            
+            if response.status_code not in [200, 201]:
+                print(f"❌ 添加失败 (状态码 {response.status_code})")
+                print(f"   响应: {response.text[:200]}")
+                return False
         
         print(f"✅ 成功添加 {len(ids)} 条文档")
         
@@ -217,35 +333,18 @@ def init_knowledge_base():
         print(f"❌ 添加异常: {e}")
         return False
     
-    # 测试查询
+    # 测试查询:直接在刚上传的向量上计算余弦相似度,无需再请求 Chroma
     print(f"\n🧪 测试查询...")
     test_query = "自行车的安装教程"
-    test_embedding = generate_embedding(test_query)
+    test_embedding = generate_embeddings([test_query])[0]
     
-    try:
-        query_payload = {
-            "query_embeddings": [test_embedding],
-            "n_results": 3
-        }
-        
-        response = requests.post(
-            f"{chroma_url}/api/v2/tenants/{tenant}/databases/{database}/collections/{collection_id}/query",
-            json=query_payload,
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            results = response.json()
-            documents_list = results.get("documents", [[]])[0] if "documents" in results else []
-            print(f"   查询: '{test_query}'")
-            print(f"   结果数: {len(documents_list)}")
-            if documents_list:
-                print(f"   Top 1: {documents_list[0][:100]}...")
-        else:
-            print(f"❌ 查询失败 (状态码 {response.status_code})")
-            
-    except Exception as e:
-        print(f"❌ 查询异常: {e}")
+    scores = embeddings @ (test_embedding / np.linalg.norm(test_embedding))
+    top = np.argsort(-scores)[:3]
+    
+    print(f"   查询: '{test_query}'")
+    print(f"   结果数: {len(top)}")
+    if len(top):
+        print(f"   Top 1: {documents[top[0]][:100]}...")
     
     print(f"\n🎉 知识库初始化完成!")
     return True
@@ -3,7 +3,8 @@ MCP Server - 提供订单管理工具服务
 使用 FastMCP 实现标准 MCP 协议
 """
 import os
-import requests
+import httpx
+from cachetools import TTLCache
 from mcp.server.fastmcp import FastMCP
 
 # 创建 MCP 服务器
@@ -12,9 +13,32 @@ mcp = FastMCP("OrderManager")
 # Java Shop API 地址
 JAVA_SHOP_URL = os.getenv("JAVA_SHOP_URL", "http://java-shop:8080")
 
+# 共享的异步 HTTP 客户端（keep-alive + 连接池 + 连接失败重试）
+ASYNC_CLIENT = httpx.AsyncClient(
+    base_url=JAVA_SHOP_URL,
+    timeout=10.0,
+    transport=httpx.AsyncHTTPTransport(
+        retries=3,
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+    )
+)
+
+# 商品搜索结果缓存（30 秒过期，库存变化可及时生效）
+_search_cache = TTLCache(maxsize=256, ttl=30)
+
+
+async def _search_products_cached(keyword: str) -> tuple:
+    """按关键词搜索商品，结果缓存 30 秒"""
+    products = _search_cache.get(keyword)
+    if products is None:
+        response = await ASYNC_CLIENT.get("/api/products/search", params={"keyword": keyword})
+        response.raise_for_status()
+        products = _search_cache[keyword] = tuple(response.json())
+    return products
+
 
 @mcp.tool()
-def search_product(keyword: str) -> str:
+async def search_product(keyword: str) -> str:
     """
     搜索商品
     
@@ -25,37 +49,35 @@ def search_product(keyword: str) -> str:
         匹配的商品列表
     """
     try:
-        url = f"{JAVA_SHOP_URL}/api/products/search?keyword={keyword}"
-        response = requests.get(url, timeout=10)
-        
-        if response.status_code != 200:
-            return f"❌ 搜索商品失败：HTTP {response.status_code}"
-        
-        products = response.json()
+        products = await _search_products_cached(keyword)
         
         if not products:
             return f"❌ 未找到与 '{keyword}' 相关的商品"
         
-        result = f"🔍 找到 {len(products)} 个商品：\n\n"
+        parts = [f"🔍 找到 {len(products)} 个商品：\n\n"]
         for product in products:
-            result += f"商品ID：{product.get('id')}\n"
-            result += f"商品名称：{product.get('name')}\n"
-            result += f"价格：¥{product.get('price')}\n"
-            result += f"类别：{product.get('category')}\n"
-            result += f"库存：{product.get('stock')}\n"
-            result += f"描述：{product.get('description')}\n"
-            result += "---\n"
-        
-        return result
-        
-    except requests.exceptions.RequestException as e:
+            parts.append(
+                f"商品ID：{product.get('id')}\n"
+                f"商品名称：{product.get('name')}\n"
+                f"价格：¥{product.get('price')}\n"
+                f"类别：{product.get('category')}\n"
+                f"库存：{product.get('stock')}\n"
+                f"描述：{product.get('description')}\n"
+                "---\n"
+            )
+        
+        return "".join(parts)
+        
+    except httpx.HTTPStatusError as e:
+        return f"❌ 搜索商品失败：HTTP {e.response.status_code}"
+    except httpx.HTTPError as e:
         return f"❌ 搜索商品失败：{str(e)}"
     except Exception as e:
         return f"❌ 系统错误：{str(e)}"
 
 
 @mcp.tool()
-def create_order(
+async def create_order(
     productName: str,
     quantity: int,
     customerName: str,
@@ -76,63 +98,46 @@ def create_order(
         订单创建结果（包含订单号）
     """
     try:
-        # 1. 先搜索商品，获取商品ID
-        search_url = f"{JAVA_SHOP_URL}/api/products/search?keyword={productName}"
-        search_response = requests.get(search_url, timeout=10)
-        
-        if search_response.status_code != 200:
-            return f"❌ 搜索商品失败：HTTP {search_response.status_code}"
-        
-        products = search_response.json()
-        
-        if not products:
-            return f"❌ 未找到商品 '{productName}'，请检查商品名称是否正确"
-        
-        # 使用第一个匹配的商品
-        product = products[0]
-        product_id = product.get('id')
-        product_name = product.get('name')
-        product_price = product.get('price')
-        
-        # 2. 创建订单
-        url = f"{JAVA_SHOP_URL}/api/orders"
+        # 由 Java 服务端按商品名称匹配商品并下单，只需一次请求
         payload = {
-            "productId": product_id,
+            "productName": productName,
             "quantity": quantity,
             "customerName": customerName,
             "customerPhone": customerPhone,
             "shippingAddress": shippingAddress
         }
         
-        response = requests.post(url, json=payload, timeout=10)
+        response = await ASYNC_CLIENT.post("/api/orders/by-name", json=payload)
         
         if response.status_code == 200:
             order = response.json()
-            total_price = product_price * quantity
+            product = order.get('product') or {}
             return f"""✅ 订单创建成功！
 
 订单号：{order.get('orderNumber')}
-商品名称：{product_name}
-单价：¥{product_price}
+商品名称：{product.get('name')}
+单价：¥{product.get('price')}
 数量：{order.get('quantity')}
-总价：¥{total_price}
+总价：¥{order.get('totalPrice')}
 客户姓名：{order.get('customerName')}
 联系电话：{order.get('customerPhone')}
 收货地址：{order.get('shippingAddress')}
 订单状态：{order.get('status')}
 
 您可以随时查询订单状态或取消订单。"""
+        elif response.status_code == 400:
+            return f"❌ 创建订单失败：{response.json().get('error')}"
         else:
             return f"❌ 创建订单失败：HTTP {response.status_code}"
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"❌ 创建订单失败：{str(e)}"
     except Exception as e:
         return f"❌ 系统错误：{str(e)}"
 
 
 @mcp.tool()
-def query_order(orderNumber: str = None) -> str:
+async def query_order(orderNumber: str = None) -> str:
     """
     查询订单信息
     
@@ -143,8 +148,7 @@ def query_order(orderNumber: str = None) -> str:
         订单信息
     """
     try:
-        url = f"{JAVA_SHOP_URL}/api/orders"
-        response = requests.get(url, timeout=10)
+        response = await ASYNC_CLIENT.get("/api/orders")
         
         if response.status_code != 200:
             return f"❌ 查询订单失败：HTTP {response.status_code}"
@@ -176,25 +180,27 @@ def query_order(orderNumber: str = None) -> str:
 订单状态：{target_order.get('status')}"""
         
         # 返回所有订单
-        result = f"📋 共有 {len(orders)} 个订单：\n\n"
+        parts = [f"📋 共有 {len(orders)} 个订单：\n\n"]
         for order in orders:
-            result += f"订单号：{order.get('orderNumber')}\n"
-            result += f"商品ID：{order.get('productId')}\n"
-            result += f"数量：{order.get('quantity')}\n"
-            result += f"客户：{order.get('customerName')}\n"
-            result += f"状态：{order.get('status')}\n"
-            result += "---\n"
-        
-        return result
-        
-    except requests.exceptions.RequestException as e:
+            parts.append(
+                f"订单号：{order.get('orderNumber')}\n"
+                f"商品ID：{order.get('productId')}\n"
+                f"数量：{order.get('quantity')}\n"
+                f"客户：{order.get('customerName')}\n"
+                f"状态：{order.get('status')}\n"
+                "---\n"
+            )
+        
+        return "".join(parts)
+        
+    except httpx.HTTPError as e:
         return f"❌ 查询订单失败：{str(e)}"
     except Exception as e:
         return f"❌ 系统错误：{str(e)}"
 
 
 @mcp.tool()
-def cancel_order(orderNumber: str) -> str:
+async def cancel_order(orderNumber: str) -> str:
     """
     取消订单
     
@@ -205,8 +211,7 @@ def cancel_order(orderNumber: str) -> str:
         取消结果
     """
     try:
-        url = f"{JAVA_SHOP_URL}/api/orders/{orderNumber}"
-        response = requests.delete(url, timeout=10)
+        response = await ASYNC_CLIENT.delete(f"/api/orders/{orderNumber}")
         
         if response.status_code == 200:
             return f"✅ 订单 {orderNumber} 已成功取消"
@@ -215,7 +220,7 @@ def cancel_order(orderNumber: str) -> str:
         else:
             return f"❌ 取消订单失败：HTTP {response.status_code}"
             
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"❌ 取消订单失败：{str(e)}"
     except Exception as e:
         return f"❌ 系统错误：{str(e)}"